@@ -1,16 +1,40 @@
 import os
 import sqlite3
+import threading
 from typing import List
 from mcp import MCPServer, Resource, ResourceRequest, ResourceResponse
 
 DATABASE_FILE = "papers.db"
 
+# One connection per thread, reused across requests so we don't pay the
+# connect/close (and schema parse) cost on every MCP call.
+_local = threading.local()
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Return this thread's cached SQLite connection, creating it on first use.
+    WAL mode allows concurrent readers, and the remaining pragmas size the
+    page cache / mmap window for a read-mostly server workload. sqlite3
+    caches compiled statements per connection, so repeated queries also
+    skip re-parsing.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        _local.conn = conn
+    return conn
+
 def init_db():
     """
     Create and populate a 'papers' table with some famous LLM & IR papers.
     If the table already exists, it won't overwrite data.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = get_conn()
     c = conn.cursor()
 
     # Create table if not exists
@@ -23,6 +47,37 @@ def init_db():
         )
     """)
 
+    # Full-text index over papers. The trigram tokenizer supports substring
+    # matches, so queries hit the index instead of scanning every row.
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+            title, abstract, authors,
+            content='papers', content_rowid='id',
+            tokenize='trigram'
+        )
+    """)
+    # Triggers keep the FTS index in sync with the papers table
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+            INSERT INTO papers_fts(rowid, title, abstract, authors)
+            VALUES (new.id, new.title, new.abstract, new.authors);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+            INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+            VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+            INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors)
+            VALUES ('delete', old.id, old.title, old.abstract, old.authors);
+            INSERT INTO papers_fts(rowid, title, abstract, authors)
+            VALUES (new.id, new.title, new.abstract, new.authors);
+        END
+    """)
+
     # Insert some well-known papers if table is empty
     c.execute("SELECT COUNT(*) FROM papers")
     count = c.fetchone()[0]
@@ -55,33 +110,38 @@ def init_db():
             )
         ]
         c.executemany("INSERT INTO papers (title, abstract, authors) VALUES (?, ?, ?)", papers_data)
-        conn.commit()
 
-    conn.close()
+    # Rebuild the FTS index from the content table unconditionally: a
+    # pre-existing papers.db created before the FTS table was introduced
+    # has rows the triggers never saw. The rebuild is idempotent and cheap.
+    c.execute("INSERT INTO papers_fts(papers_fts) VALUES('rebuild')")
+    conn.commit()
 
 def search_papers(query: str) -> List[dict]:
     """
-    Simple search in the 'papers' table by matching 'query' against title or abstract or authors.
-    Returns a list of dicts with matching papers.
+    Full-text search in the 'papers' table, matching 'query' against title,
+    abstract and authors via the FTS5 index. Returns a list of dicts with
+    matching papers, best matches first.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    c = conn.cursor()
-    # Naive LIKE-based search (for demo). You could use FTS for more advanced search.
-    wildcard_query = f"%{query}%"
+    c = get_conn().cursor()
+    # Quote the query so it is treated as a literal string, not FTS syntax
+    fts_query = '"' + query.replace('"', '""') + '"'
     c.execute("""
-        SELECT title, abstract, authors
-        FROM papers
-        WHERE title LIKE ? OR abstract LIKE ? OR authors LIKE ?
-    """, (wildcard_query, wildcard_query, wildcard_query))
+        SELECT p.title, p.abstract, p.authors
+        FROM papers_fts f
+        JOIN papers p ON p.id = f.rowid
+        WHERE papers_fts MATCH ?
+        ORDER BY rank
+        LIMIT 50
+    """, (fts_query,))
     rows = c.fetchall()
-    conn.close()
 
     results = []
     for row in rows:
         results.append({
-            "title": row[0],
-            "abstract": row[1],
-            "authors": row[2]
+            "title": row["title"],
+            "abstract": row["abstract"],
+            "authors": row["authors"]
         })
     return results
 
@@ -4,18 +4,27 @@ import uuid
 import json
 import datetime
 import logging
+import random
+import re
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from dotenv import load_dotenv
+import numpy as np
 import openai
+import orjson
 import tiktoken
 
 # Langchain imports
 from langchain.document_loaders import PyPDFLoader
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
 
 # OpenSearch
 from opensearchpy import OpenSearch, helpers
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.serializer import JSONSerializer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -25,8 +34,14 @@ PDF_DIR = os.getenv("PDF_DIR", "./pdfs")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_SUMMARY_MODEL = os.getenv("OPENAI_SUMMARY_MODEL", "gpt4o-mini")
 OPENAI_EMBEDDINGS_MODEL = os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIM = 1536  # for text-embedding-ada-002
 SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))  # max tokens for summary output
 CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2048"))  # max tokens allowed for summary input
+EMBED_BATCH_TOKEN_LIMIT = int(os.getenv("EMBED_BATCH_TOKEN_LIMIT", "250000"))  # max tokens per embeddings request
+EMBED_INPUT_MAX_TOKENS = int(os.getenv("EMBED_INPUT_MAX_TOKENS", "8191"))  # model's per-input token limit
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "2048"))  # max texts per embeddings request (API array limit)
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "5"))  # concurrent embeddings requests
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))  # retries per batch on rate limiting
 
 # OpenSearch configuration
 OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "localhost")
@@ -34,10 +49,15 @@ OPENSEARCH_PORT = int(os.getenv("OPENSEARCH_PORT", "9200"))
 OPENSEARCH_USER = os.getenv("OPENSEARCH_USER", "")
 OPENSEARCH_PASSWORD = os.getenv("OPENSEARCH_PASSWORD", "")
 OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX", "documents")
+OPENSEARCH_BULK_CHUNK = int(os.getenv("OPENSEARCH_BULK_CHUNK", "500"))  # actions per bulk request
+OPENSEARCH_BULK_THREADS = int(os.getenv("OPENSEARCH_BULK_THREADS", "4"))  # concurrent bulk requests
 
 # Chunking mode: "paragraph" or "semantic"
 CHUNK_MODE = os.getenv("CHUNK_MODE", "paragraph")
 
+# Number of PDF files to process in parallel
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
 # Set up OpenAI API key
 openai.api_key = OPENAI_API_KEY
 
@@ -45,42 +65,50 @@ openai.api_key = OPENAI_API_KEY
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Paragraph boundary: a blank (possibly whitespace-only) line. Compiled once
+# so paragraph splitting is a single pass over the text.
+_PARA_RE = re.compile(r"\n[ \t]*\n")
+
+
+@lru_cache(maxsize=8)
+def _enc(model: str):
+    """Return the tiktoken encoding for a model, cached per model.
+    encoding_for_model re-parses the BPE tables on every call, so the
+    lookup is done once and reused for all subsequent token counts."""
+    return tiktoken.encoding_for_model(model)
+
 
 def count_tokens(text: str, model: str) -> int:
     """Return number of tokens in text for the given model."""
-    encoding = tiktoken.encoding_for_model(model)
-    tokens = encoding.encode(text)
+    tokens = _enc(model).encode(text)
     return len(tokens)
 
 
-def truncate_text(text: str, max_tokens: int, model: str) -> str:
-    """Truncate text so that it does not exceed max_tokens."""
-    encoding = tiktoken.encoding_for_model(model)
-    tokens = encoding.encode(text)
-    if len(tokens) <= max_tokens:
-        return text
-    truncated_tokens = tokens[:max_tokens]
-    return encoding.decode(truncated_tokens)
+def tokenize_once(text: str, model: str) -> list:
+    """Encode text to tokens once so callers can reuse the token list."""
+    return _enc(model).encode(text)
 
 
-def generate_summary(text: str) -> str:
+def generate_summary(doc_tokens: list) -> str:
     """
-    Generate a summary of the given text using OpenAI completions.
-    Truncates the input if needed so that it fits within the model’s context.
+    Generate a summary from a pre-tokenized document using OpenAI completions.
+    Taking the token list (rather than the raw text) lets the caller encode
+    the document once and reuse the tokens here for context-budget truncation.
     """
+    encoding = _enc(OPENAI_SUMMARY_MODEL)
+    # Leave room in the context budget for the prompt scaffolding
+    scaffold = "Summarize the following document:\n\n\n\nSummary:"
+    budget = CONTEXT_MAX_TOKENS - len(encoding.encode(scaffold))
+    text = encoding.decode(doc_tokens[:budget])
     prompt = f"Summarize the following document:\n\n{text}\n\nSummary:"
-    # Truncate prompt if too long
-    prompt = truncate_text(prompt, CONTEXT_MAX_TOKENS, OPENAI_SUMMARY_MODEL)
     try:
-        response = openai.Completion.create(
+        response = openai.ChatCompletion.create(
             model=OPENAI_SUMMARY_MODEL,
-            prompt=prompt,
+            messages=[{"role": "user", "content": prompt}],
             max_tokens=SUMMARY_MAX_TOKENS,
-            temperature=0.5,
-            n=1,
-            stop=None
+            temperature=0.5
         )
-        summary = response.choices[0].text.strip()
+        summary = response.choices[0].message["content"].strip()
         logger.info("Summary generated successfully.")
         return summary
     except Exception as e:
@@ -97,33 +125,124 @@ def chunk_document(text: str) -> list:
     chunks = []
     if CHUNK_MODE.lower() == "paragraph":
         # Simple paragraph split – ignore empty paragraphs
-        for paragraph in text.split("\n\n"):
-            p = paragraph.strip()
-            if p:
-                chunks.append(p)
+        chunks = [p.strip() for p in _PARA_RE.split(text) if p.strip()]
         logger.info(f"Document split into {len(chunks)} paragraph chunks.")
     elif CHUNK_MODE.lower() == "semantic":
-        # Use a more advanced splitter
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        # Use a more advanced splitter, sized in tokens via the cached
+        # encoding (tiktoken caches encodings by name, so no re-parse)
+        splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=_enc(OPENAI_SUMMARY_MODEL).name,
+            chunk_size=1000, chunk_overlap=200
+        )
         chunks = splitter.split_text(text)
         logger.info(f"Document split into {len(chunks)} semantic chunks.")
     else:
         logger.warning("Unknown CHUNK_MODE specified. Defaulting to paragraph split.")
-        for paragraph in text.split("\n\n"):
-            p = paragraph.strip()
-            if p:
-                chunks.append(p)
+        chunks = [p.strip() for p in _PARA_RE.split(text) if p.strip()]
     return chunks
 
 
-def get_embedding(text: str, embedder: OpenAIEmbeddings) -> list:
-    """Generate an embedding for the given text using OpenAI embeddings."""
-    try:
-        embedding = embedder.embed_query(text)
-        return embedding
-    except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
-        return []
+def _embed_batch(batch: list) -> list:
+    """
+    Embed a single batch of texts with one raw OpenAI API call, retrying on
+    rate limiting. A small random jitter is added before each attempt so
+    concurrent batches do not all hit the API at the same instant.
+    """
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        time.sleep(random.uniform(0, 0.1))
+        try:
+            response = openai.Embedding.create(model=OPENAI_EMBEDDINGS_MODEL, input=batch)
+            data = sorted(response["data"], key=lambda d: d["index"])
+            return [d["embedding"] for d in data]
+        except openai.error.RateLimitError as e:
+            if attempt == EMBED_MAX_RETRIES:
+                logger.error(f"Rate limit exceeded after {EMBED_MAX_RETRIES} retries: {e}")
+                return [[] for _ in batch]
+            # Honor Retry-After if the API provided one, else back off exponentially
+            retry_after = getattr(e, "headers", None) and e.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after else 2 ** attempt
+            logger.warning(f"Rate limited, retrying batch in {delay:.1f}s...")
+            time.sleep(delay)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Error generating embedding: {e}")
+                return [[]]
+            # One bad input must not take out its whole batch: bisect and
+            # retry each half so only the offending item is lost
+            logger.warning(f"Embeddings request failed for a batch of {len(batch)}, bisecting: {e}")
+            mid = len(batch) // 2
+            return _embed_batch(batch[:mid]) + _embed_batch(batch[mid:])
+
+
+def quantize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Quantize float embeddings to int8 for the byte knn_vector field, using
+    a fixed scale factor of 127. Note that components of a unit-normalized
+    1536-dim embedding are typically ~±0.03, so most values land in a small
+    band around zero rather than spanning the int8 range; what matters is
+    that the ingest and query sides apply the same scale. Accepts a single
+    vector or a whole embedding matrix, quantized in one vectorized step.
+    """
+    return np.clip(np.round(np.asarray(embeddings) * 127), -128, 127).astype(np.int8)
+
+
+def embed_texts(texts: list) -> list:
+    """
+    Generate embeddings for a list of texts using batched OpenAI calls.
+    The embeddings endpoint accepts an array input, so texts are grouped
+    into batches (capped by EMBED_BATCH_SIZE items and EMBED_BATCH_TOKEN_LIMIT
+    tokens) and up to EMBED_MAX_WORKERS batches are submitted concurrently
+    to hide the per-request API latency. Results come back in input order.
+    """
+    # Group texts into batches that respect the per-request limits
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    for text in texts:
+        tokens = tokenize_once(text, OPENAI_EMBEDDINGS_MODEL)
+        if len(tokens) > EMBED_INPUT_MAX_TOKENS:
+            # Truncate over-long inputs to the model's per-input limit so a
+            # single oversized chunk cannot fail its whole request
+            tokens = tokens[:EMBED_INPUT_MAX_TOKENS]
+            text = _enc(OPENAI_EMBEDDINGS_MODEL).decode(tokens)
+        text_tokens = len(tokens)
+        if current_batch and (len(current_batch) >= EMBED_BATCH_SIZE
+                              or current_tokens + text_tokens > EMBED_BATCH_TOKEN_LIMIT):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(text)
+        current_tokens += text_tokens
+    if current_batch:
+        batches.append(current_batch)
+
+    embeddings = []
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_WORKERS) as executor:
+        # executor.map preserves batch order, so results line up with texts
+        for batch_embeddings in executor.map(_embed_batch, batches):
+            embeddings.extend(batch_embeddings)
+    return embeddings
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    OpenSearch serializer backed by orjson. Bulk bodies are dominated by the
+    1536-float embedding lists, which orjson encodes several times faster
+    than the stdlib json module.
+    """
+    def dumps(self, data):
+        if isinstance(data, str):
+            return data
+        try:
+            return orjson.dumps(data, default=self.default).decode("utf-8")
+        except (ValueError, TypeError) as e:
+            raise SerializationError(data, e)
+
+    def loads(self, s):
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(s, e)
 
 
 def create_opensearch_client() -> OpenSearch:
@@ -132,7 +251,8 @@ def create_opensearch_client() -> OpenSearch:
         hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
         http_auth=(OPENSEARCH_USER, OPENSEARCH_PASSWORD) if OPENSEARCH_USER and OPENSEARCH_PASSWORD else None,
         use_ssl=False,  # Set to True if SSL is required
-        verify_certs=False
+        verify_certs=False,
+        serializer=OrjsonSerializer()
     )
     return client
 
@@ -146,7 +266,9 @@ def create_index_if_not_exists(client: OpenSearch, index_name: str):
     mapping = {
         "settings": {
             "number_of_shards": 1,
-            "number_of_replicas": 0
+            "number_of_replicas": 0,
+            "index.knn": True,
+            "index.knn.algo_param.ef_search": 100
         },
         "mappings": {
             "properties": {
@@ -156,8 +278,20 @@ def create_index_if_not_exists(client: OpenSearch, index_name: str):
                 "timestamp": {"type": "date"},
                 "chunk_text": {"type": "text"},
                 "embedding": {
-                    "type": "dense_vector",
-                    "dims": 1536  # for text-embedding-ada-002
+                    # Native kNN field backed by an HNSW graph, so queries do
+                    # an approximate-NN traversal instead of a full scan.
+                    # Vectors are stored as int8 (see quantize_embedding),
+                    # quartering storage and distance-computation cost; byte
+                    # vectors require the lucene engine.
+                    "type": "knn_vector",
+                    "dimension": EMBEDDING_DIM,
+                    "data_type": "byte",
+                    "method": {
+                        "name": "hnsw",
+                        "space_type": "cosinesimil",
+                        "engine": "lucene",
+                        "parameters": {"m": 16, "ef_construction": 100}
+                    }
                 },
                 "my_join_field": {
                     "type": "join",
@@ -172,70 +306,112 @@ def create_index_if_not_exists(client: OpenSearch, index_name: str):
     logger.info(f"Index '{index_name}' created with mapping.")
 
 
-def index_documents_to_opensearch(client: OpenSearch, parent_doc: dict, child_docs: list):
-    """Indexes the parent document and its child chunk documents."""
-    actions = []
-
-    # Prepare parent document
-    parent_action = {
-        "_op_type": "index",
-        "_index": OPENSEARCH_INDEX,
-        "_id": parent_doc["doc_id"],
-        "_source": parent_doc
-    }
-    actions.append(parent_action)
+def index_documents_to_opensearch(client: OpenSearch, parent_doc: dict,
+                                  chunk_ids: list, chunk_texts: list,
+                                  embeddings: np.ndarray):
+    """
+    Indexes the parent document and its child chunk documents.
+    Children arrive as parallel arrays (ids, texts, embedding matrix) and
+    the child dicts are built lazily in a generator, so the full action
+    list is never materialized.
+    """
+    parent_id = parent_doc["doc_id"]
+    # Quantize the whole embedding matrix in one vectorized step
+    quantized = quantize_embeddings(embeddings)
 
-    # Prepare child documents with join field linking to parent
-    for child in child_docs:
-        action = {
+    def actions():
+        # Parent document first
+        yield {
             "_op_type": "index",
             "_index": OPENSEARCH_INDEX,
-            "_id": child["chunk_id"],
-            "_source": child,
-            "routing": parent_doc["doc_id"]  # ensure parent-child routing
+            "_id": parent_id,
+            "_source": parent_doc
         }
-        actions.append(action)
+        # Child documents with join field linking to parent
+        for i in range(len(chunk_ids)):
+            yield {
+                "_op_type": "index",
+                "_index": OPENSEARCH_INDEX,
+                "_id": chunk_ids[i],
+                "_source": {
+                    "chunk_id": chunk_ids[i],
+                    "chunk_text": chunk_texts[i],
+                    "embedding": quantized[i].tolist(),
+                    "my_join_field": {"name": "chunk", "parent": parent_id}
+                },
+                "routing": parent_id  # ensure parent-child routing
+            }
 
     try:
-        helpers.bulk(client, actions)
-        logger.info(f"Indexed parent doc {parent_doc['doc_id']} with {len(child_docs)} child chunks.")
+        # parallel_bulk overlaps bulk requests across connections, so large
+        # chunk sets are not serialized on OpenSearch round-trips
+        for ok, item in helpers.parallel_bulk(
+            client,
+            actions(),
+            thread_count=OPENSEARCH_BULK_THREADS,
+            chunk_size=OPENSEARCH_BULK_CHUNK,
+            raise_on_error=False
+        ):
+            if not ok:
+                logger.error(f"Failed to index item: {item}")
+        logger.info(f"Indexed parent doc {parent_id} with {len(chunk_ids)} child chunks.")
     except Exception as e:
         logger.error(f"Error during bulk indexing: {e}")
 
 
-def process_pdf_file(file_path: str, embedder: OpenAIEmbeddings, client: OpenSearch):
+def process_pdf_file(file_path: str, client: OpenSearch):
     """Process a single PDF file: load, summarize, chunk, embed, and index."""
     try:
         logger.info(f"Processing file: {file_path}")
         loader = PyPDFLoader(file_path)
-        documents = loader.load()  # returns a list of Langchain Document objects
-        # Combine all pages into one text
-        full_text = "\n\n".join([doc.page_content for doc in documents])
+
+        # Stream pages through the chunker instead of materializing the whole
+        # document: only the current page plus a carry buffer stay in memory.
+        chunks = []
+        buffer = ""      # trailing partial chunk, carried across page boundaries
+        doc_tokens = []  # summary input tokens, accumulated up to the context budget
+        for page in loader.lazy_load():
+            page_text = page.page_content
+            # Stop tokenizing for the summary once the context budget is met;
+            # generate_summary truncates to the budget anyway
+            if len(doc_tokens) < CONTEXT_MAX_TOKENS:
+                separator = "\n\n" if doc_tokens else ""
+                doc_tokens.extend(tokenize_once(separator + page_text, OPENAI_SUMMARY_MODEL))
+            buffer = f"{buffer}\n\n{page_text}" if buffer else page_text
+            page_chunks = chunk_document(buffer)
+            if page_chunks:
+                # The last chunk may continue on the next page, so keep it
+                # in the buffer and emit the rest
+                chunks.extend(page_chunks[:-1])
+                buffer = page_chunks[-1]
+        if buffer.strip():
+            chunks.append(buffer.strip())
     except Exception as e:
         logger.error(f"Error loading PDF {file_path}: {e}")
         return
 
     # Generate summary for the full document
-    summary = generate_summary(full_text)
-
-    # Chunk the text
-    chunks = chunk_document(full_text)
-
-    child_docs = []
-    for chunk in chunks:
-        # Concatenate the summary with the chunk text for context
-        context_text = f"Summary: {summary}\n\n{chunk}"
-        embedding = get_embedding(context_text, embedder)
-        child_doc = {
-            "chunk_id": str(uuid.uuid4()),
-            "chunk_text": chunk,
-            "embedding": embedding,
-            "my_join_field": {"name": "chunk", "parent": None}  # parent will be set in index_documents_to_opensearch
-        }
-        child_docs.append(child_doc)
+    summary = generate_summary(doc_tokens)
 
-    # Create a parent document with metadata and summary
+    # Concatenate the summary with each chunk text for context, then embed
+    # all contexts in batched API calls instead of one call per chunk
+    contexts = [f"Summary: {summary}\n\n{chunk}" for chunk in chunks]
+    embeddings = embed_texts(contexts)
+
+    # Generate the parent id up front so each child's join field is
+    # populated on construction, avoiding a second pass over the list
     parent_doc_id = str(uuid.uuid4())
+
+    # Struct-of-arrays layout: parallel id/text lists plus one contiguous
+    # embedding matrix, instead of a dict (and its per-field objects) per
+    # chunk. Failed embeddings stay as zero vectors.
+    chunk_ids = [str(uuid.uuid4()) for _ in chunks]
+    embedding_matrix = np.zeros((len(chunks), EMBEDDING_DIM), dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        if embedding:
+            embedding_matrix[i] = embedding
+
+    # Create a parent document with metadata and summary
     parent_doc = {
         "doc_id": parent_doc_id,
         "file_name": os.path.basename(file_path),
@@ -245,12 +421,36 @@ def process_pdf_file(file_path: str, embedder: OpenAIEmbeddings, client: OpenSea
         "my_join_field": "document"
     }
 
-    # Set parent id in each child join field
-    for child in child_docs:
-        child["my_join_field"]["parent"] = parent_doc_id
-
     # Index documents into OpenSearch
-    index_documents_to_opensearch(client, parent_doc, child_docs)
+    index_documents_to_opensearch(client, parent_doc, chunk_ids, chunks, embedding_matrix)
+
+
+def _prefetch(file_path: str):
+    """
+    Hint the kernel to read the file into the page cache ahead of use.
+    posix_fadvise(WILLNEED) starts readahead asynchronously, so cold-cache
+    disk reads for the whole batch overlap with PDF parsing instead of
+    blocking each worker on its first read.
+    """
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except (AttributeError, OSError):
+        # Non-POSIX platform or unreadable file; the loader reads it anyway
+        pass
+
+
+def _worker(file_path: str):
+    """
+    Process a single PDF in a worker process.
+    Each worker builds its own OpenSearch client, since connections are not
+    safe to share across process boundaries.
+    """
+    client = create_opensearch_client()
+    process_pdf_file(file_path, client)
 
 
 def main():
@@ -258,17 +458,20 @@ def main():
     client = create_opensearch_client()
     create_index_if_not_exists(client, OPENSEARCH_INDEX)
 
-    # Initialize OpenAI embeddings embedder
-    embedder = OpenAIEmbeddings(model=OPENAI_EMBEDDINGS_MODEL, openai_api_key=OPENAI_API_KEY)
-
     # Find all PDFs in the directory
     pdf_files = glob.glob(os.path.join(PDF_DIR, "*.pdf"))
     if not pdf_files:
         logger.warning(f"No PDF files found in directory: {PDF_DIR}")
         return
 
+    # Kick off kernel readahead for every file up front so disk I/O runs
+    # ahead of the workers that will parse them
     for file_path in pdf_files:
-        process_pdf_file(file_path, embedder, client)
+        _prefetch(file_path)
+
+    # PDF parsing and chunking are CPU-bound, so process files in parallel
+    with multiprocessing.Pool(INGEST_WORKERS) as pool:
+        pool.map(_worker, pdf_files)
 
 
 if __name__ == "__main__":
@@ -15,30 +15,42 @@ def openai_chat_sampler(request: SampleRequest) -> SampleResponse:
     """
     # request.prompt might have 'system', 'user', or might just have a single text prompt.
     # The MCP "sampling" concept is fairly open; we'll do a chat-based approach here.
-    
+
     system_prompt = request.prompt.get("system", "")
     user_prompt = request.prompt.get("user", "")
-    
+
     # Retrieve temperature or default to 0.7
     temperature = request.settings.get("temperature", 0.7)
-    
+    # Callers can request streaming to receive tokens as they are generated
+    stream = request.settings.get("stream", False)
+
     # Construct chat messages:
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
     if user_prompt:
         messages.append({"role": "user", "content": user_prompt})
-    
+
     # Call OpenAI ChatCompletion
     try:
         response = openai.ChatCompletion.create(
             model=MODEL_NAME,
             messages=messages,
-            temperature=temperature
+            temperature=temperature,
+            stream=stream
         )
+        if stream:
+            # Expose an iterable of partial tokens so the client can render
+            # output as it arrives instead of waiting for the full answer
+            def token_stream():
+                for chunk in response:
+                    delta = chunk.choices[0].delta.get("content", "")
+                    if delta:
+                        yield delta
+            return SampleResponse(stream=token_stream())
         text_out = response.choices[0].message["content"].strip()
         return SampleResponse(text=text_out)
-    
+
     except Exception as e:
         return SampleResponse(text=f"[ERROR calling OpenAI] {str(e)}")
 
@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+from concurrent.futures import ThreadPoolExecutor
 from mcp import MCPClient
 
 # MCP server endpoints (adjust if using different ports)
@@ -8,34 +9,34 @@ PROMPT_SERVER_URL = "http://localhost:5002"      # Prompt server (placeholder)
 DB_RESOURCE_SERVER_URL = "http://localhost:5003" # DB resource (SQLite) server
 LLM_SERVER_URL = "http://localhost:5004"         # Sampler server (OpenAI GPT)
 
-def run_research_query(query: str):
+def gather_search_context(query: str) -> str:
     """
-    Main orchestration:
-      1. Search the web for the query using Tools server (Brave).
-      2. Search the local DB (papers.db) for matching references.
-      3. Call the LLM Sampler to synthesize a final, retrieval-augmented answer.
-      4. Return final text to display in UI.
+    Run the web and local DB searches for a query and return the combined
+    context block for the LLM.
     """
     # -------------------------
-    # (1) Web Search (Tools)
+    # (1+2) Web Search (Tools) and Local DB Search, in parallel
     # -------------------------
+    # The two searches are independent, so run them concurrently and only
+    # pay for the slower of the two instead of their sum.
     tools_client = MCPClient(TOOLS_SERVER_URL)
-    search_response = tools_client.tools.call(
-        tool_name="searchWeb", 
-        tool_input={"query": query, "limit": 3}
-    )
-    web_results = search_response.get("results", [])
-
-    # -------------------------
-    # (2) Local DB Search
-    # -------------------------
     db_client = MCPClient(DB_RESOURCE_SERVER_URL)
-    db_response = db_client.resources.call(
-        resource_name="searchPapers",
-        resource_input={"query": query}
-    )
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        web_future = executor.submit(
+            tools_client.tools.call,
+            tool_name="searchWeb",
+            tool_input={"query": query, "limit": 3}
+        )
+        db_future = executor.submit(
+            db_client.resources.call,
+            resource_name="searchPapers",
+            resource_input={"query": query}
+        )
+        search_response = web_future.result()
+        db_response = db_future.result()
+    web_results = search_response.get("results", [])
     db_matches = db_response.get("results", [])
-    
+
     # Format DB matches for the LLM context
     # E.g., "Paper Title: ... Abstract: ... Authors: ..."
     db_text_snippets = []
@@ -54,6 +55,27 @@ def run_research_query(query: str):
     combined_search_context += "\n\n".join(web_results) if web_results else "No web results.\n"
     combined_search_context += "\n\n=== DB Papers ===\n"
     combined_search_context += "\n\n".join(db_text_snippets) if db_text_snippets else "No local DB matches.\n"
+    return combined_search_context
+
+
+def run_research_query(query: str):
+    """
+    Main orchestration:
+      1. Search the web for the query using Tools server (Brave).
+      2. Search the local DB (papers.db) for matching references.
+      3. Call the LLM Sampler to synthesize a final, retrieval-augmented answer.
+      4. Return an iterable of answer fragments to stream into the UI.
+    """
+    # Streamlit reruns the whole script on every widget interaction, so
+    # cache search context per query in session state to avoid re-running
+    # the web/DB searches on reruns.
+    if "search_cache" not in st.session_state:
+        st.session_state.search_cache = {}
+    if query in st.session_state.search_cache:
+        combined_search_context = st.session_state.search_cache[query]
+    else:
+        combined_search_context = gather_search_context(query)
+        st.session_state.search_cache[query] = combined_search_context
 
     # -------------------------
     # (3) LLM Sampler Summarization
@@ -72,11 +94,15 @@ def run_research_query(query: str):
             "system": system_msg,
             "user": user_msg
         },
-        settings={"temperature": 0.4}
+        settings={"temperature": 0.4, "stream": True}
     )
-    final_answer = sample_response.get("text", "[No answer returned from LLM]")
+    # Prefer the token stream so the UI can render output as it arrives;
+    # fall back to the full text if the sampler did not stream
+    answer_stream = sample_response.get("stream")
+    if answer_stream is None:
+        answer_stream = iter([sample_response.get("text", "[No answer returned from LLM]")])
 
-    return final_answer
+    return answer_stream
 
 # Streamlit UI
 def main():
@@ -89,10 +115,10 @@ def main():
             st.warning("Please enter a query.")
         else:
             with st.spinner("Searching & Synthesizing..."):
-                result = run_research_query(user_query.strip())
-                st.success("Completed!")
-                st.write("**Answer:**")
-                st.write(result)
+                answer_stream = run_research_query(user_query.strip())
+            st.write("**Answer:**")
+            st.write_stream(answer_stream)
+            st.success("Completed!")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,12 @@
 import os
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
 from opensearchpy import OpenSearch
 import openai
 from langchain.embeddings.openai import OpenAIEmbeddings
@@ -29,6 +34,13 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_EMBEDDINGS_MODEL = os.getenv("OPENAI_EMBEDDINGS_MODEL", "text-embedding-ada-002")
 openai.api_key = OPENAI_API_KEY
 
+# Share one pooled HTTP session across all OpenAI calls so query embeddings
+# reuse keep-alive TLS connections instead of reconnecting per request.
+# This also covers concurrent handle_query calls via the pool size.
+_openai_session = requests.Session()
+_openai_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+openai.requestssession = _openai_session
+
 # Initialize OpenAI embeddings (via Langchain)
 embedder = OpenAIEmbeddings(model=OPENAI_EMBEDDINGS_MODEL, openai_api_key=OPENAI_API_KEY)
 
@@ -45,6 +57,15 @@ def create_opensearch_client() -> OpenSearch:
 # Create an OpenSearch client instance
 client = create_opensearch_client()
 
+@lru_cache(maxsize=4096)
+def _embed_cached(query: str) -> tuple:
+    """
+    Embed a normalized query string, caching results so repeated queries
+    skip the OpenAI round-trip entirely. Returns a tuple (lists are not
+    hashable/cacheable).
+    """
+    return tuple(embedder.embed_query(query))
+
 def handle_query(request: MCPRequest) -> MCPResponse:
     """
     Process a user request by:
@@ -56,30 +77,28 @@ def handle_query(request: MCPRequest) -> MCPResponse:
     query_text = request.query  # Assumes MCPRequest has a field "query"
     logger.info(f"Received query: {query_text}")
     
-    # Vectorize the user query
-    query_vector = embedder.embed_query(query_text)
+    # Vectorize the user query, normalizing whitespace/case so trivially
+    # different phrasings of the same query share a cache entry. The vector
+    # is quantized to int8 to match the byte knn_vector field in the index.
+    normalized_query = " ".join(query_text.lower().split())
+    embedding = _embed_cached(normalized_query)
+    query_vector = np.clip(np.round(np.asarray(embedding) * 127), -128, 127).astype(np.int8).tolist()
     logger.info("Query vectorization complete.")
 
     # 2. Construct a hybrid (join) OpenSearch query.
-    # This query searches for child documents (type "chunk") using a script_score that
-    # computes cosine similarity between the query vector and the stored chunk embeddings.
+    # This query searches for child documents (type "chunk") using the native
+    # kNN query against the HNSW-indexed embedding field, an approximate
+    # nearest-neighbor lookup rather than a scripted scan of every vector.
     # The "has_child" clause ensures that matching child chunks are linked to their parent document.
     opensearch_query = {
         "query": {
             "has_child": {
                 "type": "chunk",
                 "query": {
-                    "script_score": {
-                        "query": {
-                            "bool": {
-                                "should": [
-                                    {"match": {"chunk_text": query_text}}
-                                ]
-                            }
-                        },
-                        "script": {
-                            "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
-                            "params": {"query_vector": query_vector}
+                    "knn": {
+                        "embedding": {
+                            "vector": query_vector,
+                            "k": 20
                         }
                     }
                 },
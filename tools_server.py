@@ -1,5 +1,8 @@
 import os
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from mcp import MCPServer, Tool, ToolRequest, ToolResponse
 from dotenv import load_dotenv
 
@@ -8,6 +11,15 @@ load_dotenv()
 BRAVE_API_KEY = os.environ.get("BRAVE_API_KEY", "")
 BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
 
+# Shared session so calls reuse pooled keep-alive connections instead of
+# paying TCP + TLS setup on every request, with retries on transient errors.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504])
+))
+
 def search_brave(query: str, limit: int = 3):
     """
     Calls Brave Search API with the provided query.
@@ -25,9 +37,9 @@ def search_brave(query: str, limit: int = 3):
     headers = {"X-Subscription-Token": BRAVE_API_KEY}
 
     try:
-        response = requests.get(BRAVE_SEARCH_URL, headers=headers, params=params, timeout=10)
+        response = SESSION.get(BRAVE_SEARCH_URL, headers=headers, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         results = []
         for entry in data.get("web", []):